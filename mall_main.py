@@ -2,86 +2,91 @@ import os
 from dotenv import load_dotenv
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
-from anthropic import AsyncAnthropic
+from anthropic import AsyncAnthropic, APIConnectionError, APIStatusError
 import asyncio
 from rich.console import Console
 from rich.panel import Panel
 import time
 import json
+import random
+import re
+import traceback
+
+try:
+    import uvloop
+except ImportError:  # uvloop is optional and unavailable on Windows
+    uvloop = None
 
 console = Console()
 
 # Load environment variables and setup Claude
 load_dotenv()
-client = AsyncAnthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+# SDK-level retries are disabled so every retry goes through the rate limiter
+client = AsyncAnthropic(api_key=os.getenv("ANTHROPIC_API_KEY"), max_retries=0)
 
-# Rate limiting for Claude API Tier 1
+# Rate limiting for Claude API Tier 1 (token bucket refilled continuously)
 class RateLimiter:
     def __init__(self, max_requests_per_minute: int = 5):
         self.max_requests = max_requests_per_minute
-        self.request_times = []
+        self.refill_rate = max_requests_per_minute / 60.0
+        self.tokens = float(max_requests_per_minute)
+        self.last_refill = time.monotonic()
         self.daily_request_count = 0
-        self.daily_reset_time = time.time() + 86400
-
-    async def acquire(self):
-        current_time = time.time()
-        if current_time >= self.daily_reset_time:
-            self.daily_request_count = 0
-            self.daily_reset_time = current_time + 86400
+        self.daily_reset_time = self.last_refill + 86400
+        self._lock = asyncio.Lock()
 
-        self.request_times = [t for t in self.request_times if current_time - t < 60]
+    def _refill(self):
+        current_time = time.monotonic()
+        self.tokens = min(self.max_requests, self.tokens + (current_time - self.last_refill) * self.refill_rate)
+        self.last_refill = current_time
 
-        if len(self.request_times) >= self.max_requests:
-            oldest_request = self.request_times[0]
-            wait_time = 60 - (current_time - oldest_request) + 1
-            if wait_time > 0:
+    async def acquire(self):
+        # Serialize callers so concurrent waiters queue up instead of all
+        # sleeping for the same token and then firing together
+        async with self._lock:
+            current_time = time.monotonic()
+            if current_time >= self.daily_reset_time:
+                self.daily_request_count = 0
+                self.daily_reset_time = current_time + 86400
+
+            self._refill()
+
+            if self.tokens < 1:
+                wait_time = (1 - self.tokens) / self.refill_rate
                 console.print(f"[yellow]Rate limit reached. Waiting {wait_time:.1f}s...[/yellow]")
                 await asyncio.sleep(wait_time)
-                current_time = time.time()
-                self.request_times = [t for t in self.request_times if current_time - t < 60]
+                self._refill()
 
-        self.request_times.append(current_time)
-        self.daily_request_count += 1
+            self.tokens -= 1
+            self.daily_request_count += 1
 
 rate_limiter = RateLimiter(max_requests_per_minute=4)
 
-async def generate_with_timeout(client, prompt, timeout=30):
-    try:
-        await rate_limiter.acquire()
-        response = await asyncio.wait_for(
-            client.messages.create(
-                model="claude-haiku-4-5-20251001",
-                max_tokens=4096,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.7
-            ),
-            timeout=timeout
-        )
-        return response
-    except asyncio.TimeoutError:
-        console.print(f"[red]Request timed out after {timeout}s[/red]")
-        return None
-    except Exception as e:
-        error_str = str(e)
-        if "rate_limit" in error_str.lower() or "429" in error_str or "overloaded" in error_str.lower():
-            console.print(f"[yellow]Rate limit exceeded or API overloaded.[/yellow]")
-        console.print(f"[red]Error: {error_str}[/red]")
-        return None
-
-async def main():
-    try:
-        console.print(Panel("🛍️  Shopping Mall Front Desk Agent", border_style="cyan", subtitle="Multi-Step Reasoning & Planning"))
-
-        server_params = StdioServerParameters(
-            command="python",
-            args=["mall_tools.py"]
-        )
-
-        async with stdio_client(server_params) as (read, write):
-            async with ClientSession(read, write) as session:
-                await session.initialize()
-
-                system_prompt = """You are an intelligent Shopping Mall Front Desk Agent that helps visitors plan their mall experience using step-by-step reasoning.
+# Read-only tools whose results only depend on their arguments; repeat calls
+# within a session are answered from the local cache instead of the MCP server
+CACHEABLE_TOOLS = {
+    "search_shops",
+    "get_shop_details",
+    "calculate_route",
+    "verify_route",
+    "get_recommendations",
+    "check_shop_hours",
+    "get_mall_facilities",
+    "get_current_events",
+    "get_accessibility_info",
+    "calculate_accessible_route",
+}
+
+# Transient API statuses that are retried with backoff (rate limited, server errors, overloaded)
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504, 529}
+
+# Splits a protocol reply into its tag and payload in a single match
+REPLY_PATTERN = re.compile(r"^(FUNCTION_CALL|FINAL_ANSWER):\s*(.*)$", re.DOTALL)
+
+# Static system prompt. On its own it is shorter than the model's minimum
+# cacheable prefix; caching only takes effect once the transcript grows past
+# that minimum (see with_cache_breakpoint)
+SYSTEM_PROMPT = """You are an intelligent Shopping Mall Front Desk Agent that helps visitors plan their mall experience using step-by-step reasoning.
 
 You have access to these tools:
 
@@ -163,66 +168,182 @@ Assistant: FINAL_ANSWER: [Perfect! I've planned your 2-hour visit on lower floor
 
 Remember: ALWAYS reason first, then act, then verify!"""
 
+JSON_DECODER = json.JSONDecoder()
+
+# Output budget per model turn; replies that hit it are reported as truncated
+MAX_REPLY_TOKENS = 1024
+
+def complete_function_call(reply):
+    """Return the reply cut down to its FUNCTION_CALL object once that object has fully arrived, else None"""
+    if not reply.startswith("FUNCTION_CALL:"):
+        return None
+    payload = reply[len("FUNCTION_CALL:"):].lstrip()
+    if not payload.startswith("{"):
+        return None
+    try:
+        _, end = JSON_DECODER.raw_decode(payload)
+    except json.JSONDecodeError:
+        # Not complete yet (or malformed); keep reading
+        return None
+    return f"FUNCTION_CALL: {payload[:end]}"
+
+def with_cache_breakpoint(messages):
+    """Copy of the transcript with a cache breakpoint on the latest user turn, so the prefix can be reused next turn"""
+    last = messages[-1]
+    return messages[:-1] + [{
+        "role": last["role"],
+        "content": [{"type": "text", "text": last["content"], "cache_control": {"type": "ephemeral"}}]
+    }]
+
+async def stream_reply(client, messages):
+    """Stream a reply, returning as soon as a complete FUNCTION_CALL object has arrived"""
+    chunks = []
+    async with client.messages.stream(
+        model="claude-haiku-4-5-20251001",
+        max_tokens=MAX_REPLY_TOKENS,
+        system=[{"type": "text", "text": SYSTEM_PROMPT, "cache_control": {"type": "ephemeral"}}],
+        messages=with_cache_breakpoint(messages),
+        temperature=0,
+        # Don't let the model continue the prompt's User:/Assistant: transcript
+        stop_sequences=["\nUser:"]
+    ) as stream:
+        async for text in stream.text_stream:
+            chunks.append(text)
+            if "}" in text:
+                call = complete_function_call("".join(chunks).lstrip())
+                if call:
+                    # Closing the stream stops generation of anything after the call
+                    return call
+        final_message = await stream.get_final_message()
+        if final_message.stop_reason == "max_tokens":
+            console.print(f"[yellow]Reply hit the {MAX_REPLY_TOKENS}-token limit and is truncated[/yellow]")
+    return "".join(chunks)
+
+def is_retryable(error):
+    """Whether an API error is a transient rate-limit/overload failure"""
+    if isinstance(error, APIConnectionError):
+        return True
+    if isinstance(error, APIStatusError) and error.status_code in RETRYABLE_STATUS_CODES:
+        return True
+    # Errors raised mid-stream arrive as a generic APIStatusError
+    error_str = str(error).lower()
+    return "rate_limit" in error_str or "429" in error_str or "overloaded" in error_str
+
+def retry_delay(error, attempt):
+    """Seconds to wait before retrying: the server's retry-after if sent, else jittered exponential backoff"""
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers["retry-after"])
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return random.uniform(1, min(30, 2 ** attempt))
+
+async def generate_with_timeout(client, messages, timeout=30, max_attempts=5):
+    for attempt in range(1, max_attempts + 1):
+        try:
+            await rate_limiter.acquire()
+            return await asyncio.wait_for(stream_reply(client, messages), timeout=timeout)
+        except asyncio.TimeoutError:
+            console.print(f"[red]Request timed out after {timeout}s[/red]")
+            return None
+        except Exception as e:
+            if is_retryable(e) and attempt < max_attempts:
+                delay = retry_delay(e, attempt)
+                console.print(f"[yellow]Rate limit exceeded or API overloaded. Retrying in {delay:.1f}s (attempt {attempt}/{max_attempts})...[/yellow]")
+                await asyncio.sleep(delay)
+                continue
+            console.print(f"[red]Error: {e}[/red]")
+            return None
+
+async def main():
+    try:
+        console.print(Panel("🛍️  Shopping Mall Front Desk Agent", border_style="cyan", subtitle="Multi-Step Reasoning & Planning"))
+
+        server_params = StdioServerParameters(
+            command="python",
+            args=["mall_tools.py"]
+        )
+
+        async with stdio_client(server_params) as (read, write):
+            async with ClientSession(read, write) as session:
+                await session.initialize()
+
                 # Test query
                 query = "I'm planning an anniversary surprise. I need jewelry, a nice restaurant, and want lower floors for accessibility. Budget is flexible but I have only 90 minutes."
                 console.print(Panel(f"Query: {query}", border_style="green"))
 
-                prompt = f"{system_prompt}\n\nUser Query: {query}\n\nBegin your response:"
-                conversation_history = []
+                # Append-only transcript; each turn only adds new messages
+                conversation_history = [{"role": "user", "content": f"User Query: {query}\n\nBegin your response:"}]
+                tool_cache = {}
                 max_turns = 15
 
                 for turn in range(max_turns):
-                    response = await generate_with_timeout(client, prompt)
-                    if not response or not response.content[0].text:
+                    reply = await generate_with_timeout(client, conversation_history)
+                    if not reply or not reply.strip():
                         break
 
-                    result = response.content[0].text.strip()
+                    result = reply.strip()
                     console.print(f"\n[yellow]Assistant Turn {turn+1}:[/yellow] {result[:200]}...")
 
-                    if result.startswith("FUNCTION_CALL:"):
+                    match = REPLY_PATTERN.match(result)
+                    kind, payload = match.groups() if match else (None, result)
+
+                    if kind == "FUNCTION_CALL":
                         try:
-                            _, function_info = result.split(":", 1)
-                            func_data = json.loads(function_info.strip())
+                            func_data = json.loads(payload)
                             func_name = func_data["name"]
                             func_args = func_data.get("args", {})
 
                             console.print(f"[cyan]→ Calling: {func_name}({func_args})[/cyan]")
 
-                            # Call the appropriate tool (dynamically)
-                            try:
-                                tool_result = await session.call_tool(func_name, arguments=func_args)
-                            except Exception as e:
-                                console.print(f"[red]Error calling {func_name}: {e}[/red]")
-                                tool_result = None
-
-                            if tool_result and tool_result.content:
-                                result_text = tool_result.content[0].text
+                            result_text = None
+                            cache_key = (func_name, json.dumps(func_args, sort_keys=True))
+                            if cache_key in tool_cache:
+                                result_text = tool_cache[cache_key]
+                                console.print(f"[dim]↺ Reusing cached result for {func_name}[/dim]")
+                            else:
+                                # Call the appropriate tool (dynamically)
+                                try:
+                                    tool_result = await session.call_tool(func_name, arguments=func_args)
+                                except Exception as e:
+                                    console.print(f"[red]Error calling {func_name}: {e}[/red]")
+                                    tool_result = None
+
+                                if tool_result and tool_result.content:
+                                    result_text = tool_result.content[0].text
+                                    if func_name in CACHEABLE_TOOLS and not tool_result.isError:
+                                        tool_cache[cache_key] = result_text
+
+                            if result_text is not None:
                                 console.print(f"[green]← Result: {result_text[:150]}...[/green]")
-                                prompt += f"\nAssistant: {result}\nUser: Tool result: {result_text}\nAssistant:"
+                                conversation_history.append({"role": "assistant", "content": result})
+                                conversation_history.append({"role": "user", "content": f"Tool result: {result_text}"})
                             else:
-                                prompt += f"\nAssistant: {result}\nUser: Tool executed. Next step?\nAssistant:"
+                                conversation_history.append({"role": "assistant", "content": result})
+                                conversation_history.append({"role": "user", "content": "Tool executed. Next step?"})
 
                         except json.JSONDecodeError as e:
+                            # Ask the model to re-emit the call instead of ending the session
                             console.print(f"[red]JSON parse error: {e}[/red]")
-                            break
+                            conversation_history.append({"role": "assistant", "content": result})
+                            conversation_history.append({"role": "user", "content": f"Your FUNCTION_CALL was not valid JSON ({e}). Please resend it as a single valid JSON object."})
                         except Exception as e:
                             console.print(f"[red]Error executing tool: {e}[/red]")
                             break
 
-                    elif result.startswith("FINAL_ANSWER:"):
-                        answer = result.replace("FINAL_ANSWER:", "").strip()
+                    elif kind == "FINAL_ANSWER":
+                        answer = payload.strip()
                         console.print(Panel(f"[bold green]Final Answer:[/bold green]\n{answer}", border_style="green"))
                         break
                     else:
                         # Model didn't follow format, prompt it again
-                        prompt += f"\nAssistant: {result}\nUser: Please respond with FUNCTION_CALL or FINAL_ANSWER format.\nAssistant:"
+                        conversation_history.append({"role": "assistant", "content": result})
+                        conversation_history.append({"role": "user", "content": "Please respond with FUNCTION_CALL or FINAL_ANSWER format."})
 
                 console.print("\n[green]Session completed![/green]")
 
     except Exception as e:
         console.print(f"[red]Error: {e}[/red]")
-        import traceback
         traceback.print_exc()
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    asyncio.run(main(), loop_factory=uvloop.new_event_loop if uvloop else None)
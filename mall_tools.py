@@ -1,37 +1,129 @@
 from mcp.server.fastmcp import FastMCP
 from mcp.types import TextContent
 import logging
-from rich.logging import RichHandler
 import json
+import os
+import pickle
+import random
 from typing import List, Dict, Optional
 from datetime import datetime
+from functools import lru_cache
+from itertools import chain, count
 
-# Configure logging with Rich handler for colored, formatted output to file
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib encoder
+    orjson = None
+
+# Configure plain file logging; the log file is only opened on the first record
 logging.basicConfig(
     level=logging.INFO,
-    format='%(message)s',
-    handlers=[
-        RichHandler(
-            rich_tracebacks=True,
-            markup=True,
-            console=__import__('rich.console').console.Console(file=open('mall_server.log', 'a'))
-        )
-    ]
+    format='%(asctime)s %(levelname)s %(message)s',
+    handlers=[logging.FileHandler('mall_server.log', delay=True)]
 )
 logger = logging.getLogger(__name__)
 
 mcp = FastMCP("MallAssistant")
 
+def _dumps(obj) -> str:
+    """Pretty-print a tool response as JSON, using orjson when it is installed"""
+    if orjson:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(obj, indent=2)
+
+def _resp(obj) -> TextContent:
+    """Wrap an object as a pretty-printed JSON text response"""
+    return TextContent(type="text", text=_dumps(obj))
+
+def _load_mall_data(path: str = 'mall_data.json', cache_path: str = 'mall_data.pkl') -> dict:
+    """
+    Load the mall data JSON, reusing a pickle sidecar when MALL_DATA_CACHE=1
+
+    The sidecar starts with the JSON file's (mtime, size) signature and is
+    rebuilt whenever that no longer matches, so edits are still picked up.
+    """
+    if os.getenv("MALL_DATA_CACHE") != "1":
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    stat = os.stat(path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    try:
+        with open(cache_path, 'rb') as f:
+            if pickle.load(f) == signature:
+                return pickle.load(f)
+    except Exception as e:
+        # Missing, truncated or incompatible sidecar: fall back to the JSON
+        if not isinstance(e, FileNotFoundError):
+            logger.warning("Ignoring unreadable mall data cache: %s", e)
+
+    with open(path, 'r') as f:
+        data = json.load(f)
+    # Write to a per-process temp file and swap it in, so concurrent servers
+    # never read or leave behind a half-written sidecar
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(signature, f, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        logger.warning("Could not write mall data cache: %s", e)
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+    return data
+
 # Load mall data
-with open('mall_data.json', 'r') as f:
-    MALL_DATA = json.load(f)
+MALL_DATA = _load_mall_data()
+
+# Index shops by id and by lowercase name for O(1) lookups
+SHOPS_BY_ID = {shop["id"]: shop for shop in MALL_DATA["shops"]}
+SHOP_POSITIONS = {shop["id"]: position for position, shop in enumerate(MALL_DATA["shops"])}
+SHOPS_BY_NAME_LOWER = {shop["name"].lower(): shop for shop in MALL_DATA["shops"]}
+
+def _is_known_shop_id(shop_id) -> bool:
+    """Whether shop_id names a shop; malformed ids (e.g. nested lists or dicts) never match"""
+    try:
+        return shop_id in SHOPS_BY_ID
+    except TypeError:  # unhashable
+        return False
+
+# Secondary indices for search_shops (lists keep data order), plus the
+# lowercased fields the keyword filter matches against
+def _group_shops(key) -> dict:
+    """Group shops by key(shop), keeping data order within each group"""
+    groups = {}
+    for shop in MALL_DATA["shops"]:
+        groups.setdefault(key(shop), []).append(shop)
+    return groups
+
+SHOPS_BY_CATEGORY_LOWER = _group_shops(lambda shop: shop["category"].lower())
+SHOPS_BY_FLOOR = _group_shops(lambda shop: shop["floor"])
+SHOP_SEARCH_FIELDS = {
+    shop["id"]: (shop["name"].lower(), shop["description"].lower(), shop["category"].lower())
+    for shop in MALL_DATA["shops"]
+}
+
+# For get_recommendations: shop positions per category, and each shop's price
+# tier (the most "$" signs in its price range, e.g. "$-$$$" -> 3)
+ALL_CATEGORIES = frozenset(shop["category"] for shop in MALL_DATA["shops"])
+SHOP_POSITIONS_BY_CATEGORY = {
+    category: [SHOP_POSITIONS[shop["id"]] for shop in shops]
+    for category, shops in _group_shops(lambda shop: shop["category"]).items()
+}
+SHOP_PRICE_TIER = {
+    shop["id"]: max(len(tier.strip()) for tier in shop["price_range"].split("-"))
+    for shop in MALL_DATA["shops"]
+}
 
 @mcp.tool()
 def show_reasoning(steps: list) -> TextContent:
     """Display the step-by-step reasoning process for mall assistance"""
-    logger.info("[blue]FUNCTION CALL:[/blue] show_reasoning()")
+    logger.info("FUNCTION CALL: show_reasoning()")
     for i, step in enumerate(steps, 1):
-        logger.info(f"[cyan]Step {i}:[/cyan] {step}")
+        logger.info("Step %s: %s", i, step)
     return TextContent(
         type="text",
         text=f"Reasoning displayed: {len(steps)} steps"
@@ -47,33 +139,38 @@ def search_shops(category: Optional[str] = None, floor: Optional[int] = None, ke
         floor: Floor number (1-5)
         keyword: Search keyword in shop name or description
     """
-    logger.info(f"[blue]FUNCTION CALL:[/blue] search_shops(category={category}, floor={floor}, keyword={keyword})")
+    logger.info("FUNCTION CALL: search_shops(category=%s, floor=%s, keyword=%s)", category, floor, keyword)
 
-    results = []
-    for shop in MALL_DATA["shops"]:
-        match = True
+    # Start from the smallest indexed candidate list
+    candidates = MALL_DATA["shops"]
+    if category:
+        candidates = SHOPS_BY_CATEGORY_LOWER.get(category.lower(), [])
+    if floor:
+        floor_shops = SHOPS_BY_FLOOR.get(floor, [])
+        if len(floor_shops) < len(candidates):
+            candidates = floor_shops
 
-        if category and shop["category"].lower() != category.lower():
-            match = False
+    category_lower = category.lower() if category else None
+    keyword_lower = keyword.lower() if keyword else None
 
-        if floor and shop["floor"] != floor:
-            match = False
+    results = []
+    for shop in candidates:
+        name_lower, description_lower, shop_category_lower = SHOP_SEARCH_FIELDS[shop["id"]]
 
-        if keyword:
-            keyword_lower = keyword.lower()
-            if not (keyword_lower in shop["name"].lower() or
-                   keyword_lower in shop["description"].lower() or
-                   keyword_lower in shop["category"].lower()):
-                match = False
+        # Skip as soon as one filter fails so the keyword scan only runs on real candidates
+        if category and shop_category_lower != category_lower:
+            continue
+        if floor and shop["floor"] != floor:
+            continue
+        if keyword and not (keyword_lower in name_lower or
+                            keyword_lower in description_lower or
+                            keyword_lower in shop_category_lower):
+            continue
 
-        if match:
-            results.append(shop)
+        results.append(shop)
 
-    logger.info(f"[green]Found {len(results)} shops[/green]")
-    return TextContent(
-        type="text",
-        text=json.dumps(results, indent=2)
-    )
+    logger.info("Found %s shops", len(results))
+    return _resp(results)
 
 @mcp.tool()
 def get_shop_details(shop_name: str) -> TextContent:
@@ -83,17 +180,14 @@ def get_shop_details(shop_name: str) -> TextContent:
     Args:
         shop_name: Name of the shop
     """
-    logger.info(f"[blue]FUNCTION CALL:[/blue] get_shop_details(shop_name={shop_name})")
+    logger.info("FUNCTION CALL: get_shop_details(shop_name=%s)", shop_name)
 
-    for shop in MALL_DATA["shops"]:
-        if shop["name"].lower() == shop_name.lower():
-            logger.info(f"[green]Found shop: {shop['name']}[/green]")
-            return TextContent(
-                type="text",
-                text=json.dumps(shop, indent=2)
-            )
-
-    logger.warning(f"[yellow]Shop not found: {shop_name}[/yellow]")
+    shop = SHOPS_BY_NAME_LOWER.get(shop_name.lower())
+    if shop:
+        logger.info("Found shop: %s", shop['name'])
+        return _resp(shop)
+
+    logger.warning("Shop not found: %s", shop_name)
     return TextContent(
         type="text",
         text=json.dumps({"error": f"Shop '{shop_name}' not found"})
@@ -108,15 +202,10 @@ def calculate_route(shop_ids: list) -> TextContent:
     Args:
         shop_ids: List of shop IDs to visit
     """
-    logger.info(f"[blue]FUNCTION CALL:[/blue] calculate_route(shop_ids={shop_ids})")
+    logger.info("FUNCTION CALL: calculate_route(shop_ids=%s)", shop_ids)
 
     # Get shop details
-    shops = []
-    for shop_id in shop_ids:
-        for shop in MALL_DATA["shops"]:
-            if shop["id"] == shop_id:
-                shops.append(shop)
-                break
+    shops = [SHOPS_BY_ID[shop_id] for shop_id in shop_ids if _is_known_shop_id(shop_id)]
 
     if not shops:
         return TextContent(
@@ -126,12 +215,16 @@ def calculate_route(shop_ids: list) -> TextContent:
 
     # Sort by floor to minimize travel
     sorted_shops = sorted(shops, key=lambda x: x["floor"])
+    # sorted_shops is floor-ordered, so this dedupe is already in ascending order
+    floors_visited = list(dict.fromkeys(s["floor"] for s in sorted_shops))
+    n_floors = len(floors_visited)
+    n_shops = len(sorted_shops)
 
     # Calculate route info
     route = {
-        "total_shops": len(sorted_shops),
-        "floors_visited": sorted(list(set(s["floor"] for s in sorted_shops))),
-        "floor_changes": len(set(s["floor"] for s in sorted_shops)) - 1,
+        "total_shops": n_shops,
+        "floors_visited": floors_visited,
+        "floor_changes": n_floors - 1,
         "optimized_order": [
             {
                 "sequence": i + 1,
@@ -141,14 +234,11 @@ def calculate_route(shop_ids: list) -> TextContent:
             }
             for i, shop in enumerate(sorted_shops)
         ],
-        "estimated_time_minutes": len(sorted_shops) * 15 + len(set(s["floor"] for s in sorted_shops)) * 3
+        "estimated_time_minutes": n_shops * 15 + n_floors * 3
     }
 
-    logger.info(f"[green]Route calculated: {len(sorted_shops)} shops across {len(route['floors_visited'])} floors[/green]")
-    return TextContent(
-        type="text",
-        text=json.dumps(route, indent=2)
-    )
+    logger.info("Route calculated: %s shops across %s floors", n_shops, n_floors)
+    return _resp(route)
 
 @mcp.tool()
 def verify_route(shop_ids: list, constraints: dict) -> TextContent:
@@ -159,10 +249,10 @@ def verify_route(shop_ids: list, constraints: dict) -> TextContent:
         shop_ids: List of shop IDs in the route
         constraints: Dictionary of constraints like {"max_floors": 3, "max_time_minutes": 60, "required_categories": ["Food"]}
     """
-    logger.info(f"[blue]FUNCTION CALL:[/blue] verify_route(shop_ids={shop_ids}, constraints={constraints})")
+    logger.info("FUNCTION CALL: verify_route(shop_ids=%s, constraints=%s)", shop_ids, constraints)
 
-    # Get shops
-    shops = [s for s in MALL_DATA["shops"] if s["id"] in shop_ids]
+    # Get shops (each id counted once)
+    shops = [SHOPS_BY_ID[shop_id] for shop_id in dict.fromkeys(filter(_is_known_shop_id, shop_ids))]
 
     if not shops:
         return TextContent(
@@ -170,9 +260,10 @@ def verify_route(shop_ids: list, constraints: dict) -> TextContent:
             text=json.dumps({"verified": False, "error": "No valid shops"})
         )
 
-    floors = set(s["floor"] for s in shops)
-    categories = set(s["category"] for s in shops)
-    estimated_time = len(shops) * 15 + len(floors) * 3
+    floors = {s["floor"] for s in shops}
+    categories = {s["category"] for s in shops}
+    n_floors = len(floors)
+    estimated_time = len(shops) * 15 + n_floors * 3
 
     verification = {
         "verified": True,
@@ -181,11 +272,11 @@ def verify_route(shop_ids: list, constraints: dict) -> TextContent:
 
     # Check max floors
     if "max_floors" in constraints:
-        max_floors_ok = len(floors) <= constraints["max_floors"]
+        max_floors_ok = n_floors <= constraints["max_floors"]
         verification["checks"].append({
             "constraint": "max_floors",
             "required": constraints["max_floors"],
-            "actual": len(floors),
+            "actual": n_floors,
             "passed": max_floors_ok
         })
         if not max_floors_ok:
@@ -229,13 +320,22 @@ def verify_route(shop_ids: list, constraints: dict) -> TextContent:
         if not lower_floors_ok:
             verification["verified"] = False
 
-    status = "[green]✓ All constraints satisfied[/green]" if verification["verified"] else "[red]✗ Some constraints failed[/red]"
+    status = "All constraints satisfied" if verification["verified"] else "Some constraints failed"
     logger.info(status)
 
-    return TextContent(
-        type="text",
-        text=json.dumps(verification, indent=2)
-    )
+    return _resp(verification)
+
+# Recommendation context -> (categories, description)
+CONTEXT_CATEGORIES = {
+    context: (frozenset(categories), rec_text)
+    for contexts, categories, rec_text in [
+        (("anniversary", "romantic", "date"), ("Jewelry", "Fashion", "Food"), "Romantic shopping experience"),
+        (("family", "family_outing"), ("Toys", "Food", "Entertainment"), "Family-friendly activities"),
+        (("quick_lunch", "lunch", "food"), ("Food",), "Dining options"),
+        (("gift", "gift_shopping"), ("Fashion", "Books", "Jewelry", "Beauty"), "Gift shopping options"),
+    ]
+    for context in contexts
+}
 
 @mcp.tool()
 def get_recommendations(context: str, preferences: Optional[dict] = None) -> TextContent:
@@ -246,8 +346,18 @@ def get_recommendations(context: str, preferences: Optional[dict] = None) -> Tex
         context: Context like "anniversary", "family_outing", "quick_lunch", "gift_shopping"
         preferences: Optional preferences like {"budget": "low", "interests": ["fashion", "books"]}
     """
-    logger.info(f"[blue]FUNCTION CALL:[/blue] get_recommendations(context={context}, preferences={preferences})")
+    logger.info("FUNCTION CALL: get_recommendations(context=%s, preferences=%s)", context, preferences)
 
+    # Only the budget preference affects the result
+    budget = preferences.get("budget") if preferences else None
+    payload, n_shops = _recommendations_payload(context, budget if budget in ("low", "high") else None)
+
+    logger.info("Generated %s recommendations", n_shops)
+    return payload
+
+@lru_cache(maxsize=128)
+def _recommendations_payload(context: str, budget: Optional[str]) -> tuple:
+    """Build the recommendations response, returning (payload, shop_count)"""
     recommendations = {
         "context": context,
         "suggested_shops": [],
@@ -255,50 +365,33 @@ def get_recommendations(context: str, preferences: Optional[dict] = None) -> Tex
     }
 
     # Context-based recommendations
-    if context.lower() in ["anniversary", "romantic", "date"]:
-        categories = ["Jewelry", "Fashion", "Food"]
-        rec_text = "Romantic shopping experience"
-    elif context.lower() in ["family", "family_outing"]:
-        categories = ["Toys", "Food", "Entertainment"]
-        rec_text = "Family-friendly activities"
-    elif context.lower() in ["quick_lunch", "lunch", "food"]:
-        categories = ["Food"]
-        rec_text = "Dining options"
-    elif context.lower() in ["gift", "gift_shopping"]:
-        categories = ["Fashion", "Books", "Jewelry", "Beauty"]
-        rec_text = "Gift shopping options"
-    else:
-        categories = list(set(s["category"] for s in MALL_DATA["shops"]))
-        rec_text = "General recommendations"
-
-    # Filter by preferences
-    for shop in MALL_DATA["shops"]:
-        if shop["category"] in categories:
-            # Budget filter
-            if preferences and "budget" in preferences:
-                budget = preferences["budget"]
-                if budget == "low" and "$$$" in shop["price_range"]:
-                    continue
-                elif budget == "high" and shop["price_range"] == "$":
-                    continue
-
-            recommendations["suggested_shops"].append({
-                "name": shop["name"],
-                "category": shop["category"],
-                "floor": shop["floor"],
-                "description": shop["description"],
-                "hours": shop["hours"],
-                "price_range": shop["price_range"]
-            })
+    categories, rec_text = CONTEXT_CATEGORIES.get(context.lower(), (ALL_CATEGORIES, "General recommendations"))
+
+    # Filter by preferences, visiting only shops in the chosen categories (in data order)
+    positions = sorted(chain.from_iterable(SHOP_POSITIONS_BY_CATEGORY.get(c, ()) for c in categories))
+    for position in positions:
+        shop = MALL_DATA["shops"][position]
+
+        # Budget filter
+        price_tier = SHOP_PRICE_TIER[shop["id"]]
+        if budget == "low" and price_tier >= 3:
+            continue
+        elif budget == "high" and price_tier == 1:
+            continue
+
+        recommendations["suggested_shops"].append({
+            "name": shop["name"],
+            "category": shop["category"],
+            "floor": shop["floor"],
+            "description": shop["description"],
+            "hours": shop["hours"],
+            "price_range": shop["price_range"]
+        })
 
     recommendations["description"] = rec_text
     recommendations["total_recommendations"] = len(recommendations["suggested_shops"])
 
-    logger.info(f"[green]Generated {len(recommendations['suggested_shops'])} recommendations[/green]")
-    return TextContent(
-        type="text",
-        text=json.dumps(recommendations, indent=2)
-    )
+    return _resp(recommendations), recommendations["total_recommendations"]
 
 @mcp.tool()
 def check_shop_hours(shop_name: str, current_time: Optional[str] = None) -> TextContent:
@@ -309,33 +402,58 @@ def check_shop_hours(shop_name: str, current_time: Optional[str] = None) -> Text
         shop_name: Name of the shop
         current_time: Time in "HH:MM AM/PM" format (optional, defaults to current time)
     """
-    logger.info(f"[blue]FUNCTION CALL:[/blue] check_shop_hours(shop_name={shop_name}, current_time={current_time})")
-
-    for shop in MALL_DATA["shops"]:
-        if shop["name"].lower() == shop_name.lower():
-            result = {
-                "shop_name": shop["name"],
-                "hours": shop["hours"],
-                "floor": shop["floor"]
-            }
-
-            if current_time:
-                # Simple check (would need proper time parsing in production)
-                result["status"] = "Check shop hours: " + shop["hours"]
-            else:
-                result["status"] = "Shop hours: " + shop["hours"]
+    logger.info("FUNCTION CALL: check_shop_hours(shop_name=%s, current_time=%s)", shop_name, current_time)
+
+    shop = SHOPS_BY_NAME_LOWER.get(shop_name.lower())
+    if shop:
+        result = {
+            "shop_name": shop["name"],
+            "hours": shop["hours"],
+            "floor": shop["floor"]
+        }
+
+        if current_time:
+            # Simple check (would need proper time parsing in production)
+            result["status"] = "Check shop hours: " + shop["hours"]
+        else:
+            result["status"] = "Shop hours: " + shop["hours"]
 
-            logger.info(f"[green]Shop hours retrieved for {shop['name']}[/green]")
-            return TextContent(
-                type="text",
-                text=json.dumps(result, indent=2)
-            )
+        logger.info("Shop hours retrieved for %s", shop['name'])
+        return _resp(result)
 
     return TextContent(
         type="text",
         text=json.dumps({"error": f"Shop '{shop_name}' not found"})
     )
 
+# Static facilities data; the full listing is serialized once at load
+FACILITIES = {
+    "restrooms": [
+        {"location": "Floor 1, Near Food Court", "accessible": True},
+        {"location": "Floor 2, Near Cinema", "accessible": True},
+        {"location": "Floor 3, East Wing", "accessible": True},
+        {"location": "Floor 4, West Wing", "accessible": False},
+        {"location": "Floor 5, Near Fitness Center", "accessible": True}
+    ],
+    "atm": [
+        {"location": "Floor 1, Main Entrance", "bank": "Universal Bank"},
+        {"location": "Floor 3, Food Court", "bank": "City Bank"}
+    ],
+    "nursing_room": [
+        {"location": "Floor 1, Near Customer Service", "facilities": "Changing station, comfortable seating, privacy"},
+        {"location": "Floor 3, Near Family Area", "facilities": "Changing station, comfortable seating, privacy"}
+    ],
+    "parking": {
+        "levels": ["B1", "B2", "B3"],
+        "total_spaces": 800,
+        "accessible_spaces": 50,
+        "ev_charging": "B1 - 10 stations"
+    },
+    "elevators": MALL_DATA["amenities"]["elevators"],
+    "info_desk": "Ground Floor (Floor 1) - Main Entrance"
+}
+FACILITIES_PAYLOAD = _resp(FACILITIES)
+
 @mcp.tool()
 def get_mall_facilities(facility_type: Optional[str] = None) -> TextContent:
     """
@@ -344,108 +462,83 @@ def get_mall_facilities(facility_type: Optional[str] = None) -> TextContent:
     Args:
         facility_type: Type of facility (e.g., "restroom", "atm", "nursing_room", "parking", "elevator")
     """
-    logger.info(f"[blue]FUNCTION CALL:[/blue] get_mall_facilities(facility_type={facility_type})")
-
-    facilities = {
-        "restrooms": [
-            {"location": "Floor 1, Near Food Court", "accessible": True},
-            {"location": "Floor 2, Near Cinema", "accessible": True},
-            {"location": "Floor 3, East Wing", "accessible": True},
-            {"location": "Floor 4, West Wing", "accessible": False},
-            {"location": "Floor 5, Near Fitness Center", "accessible": True}
-        ],
-        "atm": [
-            {"location": "Floor 1, Main Entrance", "bank": "Universal Bank"},
-            {"location": "Floor 3, Food Court", "bank": "City Bank"}
-        ],
-        "nursing_room": [
-            {"location": "Floor 1, Near Customer Service", "facilities": "Changing station, comfortable seating, privacy"},
-            {"location": "Floor 3, Near Family Area", "facilities": "Changing station, comfortable seating, privacy"}
-        ],
-        "parking": {
-            "levels": ["B1", "B2", "B3"],
-            "total_spaces": 800,
-            "accessible_spaces": 50,
-            "ev_charging": "B1 - 10 stations"
-        },
-        "elevators": MALL_DATA["amenities"]["elevators"],
-        "info_desk": "Ground Floor (Floor 1) - Main Entrance"
-    }
+    logger.info("FUNCTION CALL: get_mall_facilities(facility_type=%s)", facility_type)
 
     if facility_type:
-        facility_type_lower = facility_type.lower().replace(" ", "_")
-        if facility_type_lower in facilities:
-            result = {facility_type: facilities[facility_type_lower]}
-        else:
-            result = {"error": f"Facility type '{facility_type}' not found", "available_types": list(facilities.keys())}
+        result = _mall_facility_payload(facility_type)
     else:
-        result = facilities
+        result = FACILITIES_PAYLOAD
 
-    logger.info(f"[green]Facility information retrieved[/green]")
-    return TextContent(
-        type="text",
-        text=json.dumps(result, indent=2)
-    )
+    logger.info("Facility information retrieved")
+    return result
+
+@lru_cache(maxsize=128)
+def _mall_facility_payload(facility_type: str) -> TextContent:
+    """Build the response for one facility type, echoing the type as it was asked for"""
+    facility_type_lower = facility_type.lower().replace(" ", "_")
+    if facility_type_lower in FACILITIES:
+        result = {facility_type: FACILITIES[facility_type_lower]}
+    else:
+        result = {"error": f"Facility type '{facility_type}' not found", "available_types": list(FACILITIES.keys())}
+
+    return _resp(result)
+
+# Mock current events data, serialized once at load
+EVENTS = {
+    "ongoing_events": [
+        {
+            "name": "Holiday Shopping Festival",
+            "location": "All Floors",
+            "dates": "Dec 1 - Dec 31",
+            "description": "Up to 50% off at participating stores",
+            "featured_shops": ["Fashion Forward", "Tech Haven", "Jewelry Junction"]
+        },
+        {
+            "name": "Kids Play Area",
+            "location": "Floor 4, Near Kids Kingdom",
+            "time": "10:00 AM - 8:00 PM daily",
+            "description": "Free supervised play area for children 3-10 years",
+            "cost": "Free"
+        },
+        {
+            "name": "Live Music Weekend",
+            "location": "Floor 3, Central Atrium",
+            "time": "Saturdays & Sundays, 2:00 PM - 5:00 PM",
+            "description": "Local artists performing live music",
+            "cost": "Free"
+        }
+    ],
+    "promotions": [
+        {
+            "title": "Dining Rewards",
+            "description": "Spend $50+ at any restaurant, get $10 voucher for next visit",
+            "valid_until": "End of month"
+        },
+        {
+            "title": "First 100 Shoppers",
+            "description": "Free gift bag on weekends (10 AM opening)",
+            "location": "Main Entrance"
+        }
+    ],
+    "upcoming": [
+        {
+            "name": "New Year's Eve Celebration",
+            "date": "Dec 31, 8:00 PM",
+            "location": "Floor 5, Rooftop",
+            "description": "Countdown party with fireworks"
+        }
+    ]
+}
+EVENTS_PAYLOAD = _resp(EVENTS)
 
 @mcp.tool()
 def get_current_events() -> TextContent:
     """
     Get information about current mall events, promotions, and activities
     """
-    logger.info(f"[blue]FUNCTION CALL:[/blue] get_current_events()")
-
-    # Mock current events data
-    events = {
-        "ongoing_events": [
-            {
-                "name": "Holiday Shopping Festival",
-                "location": "All Floors",
-                "dates": "Dec 1 - Dec 31",
-                "description": "Up to 50% off at participating stores",
-                "featured_shops": ["Fashion Forward", "Tech Haven", "Jewelry Junction"]
-            },
-            {
-                "name": "Kids Play Area",
-                "location": "Floor 4, Near Kids Kingdom",
-                "time": "10:00 AM - 8:00 PM daily",
-                "description": "Free supervised play area for children 3-10 years",
-                "cost": "Free"
-            },
-            {
-                "name": "Live Music Weekend",
-                "location": "Floor 3, Central Atrium",
-                "time": "Saturdays & Sundays, 2:00 PM - 5:00 PM",
-                "description": "Local artists performing live music",
-                "cost": "Free"
-            }
-        ],
-        "promotions": [
-            {
-                "title": "Dining Rewards",
-                "description": "Spend $50+ at any restaurant, get $10 voucher for next visit",
-                "valid_until": "End of month"
-            },
-            {
-                "title": "First 100 Shoppers",
-                "description": "Free gift bag on weekends (10 AM opening)",
-                "location": "Main Entrance"
-            }
-        ],
-        "upcoming": [
-            {
-                "name": "New Year's Eve Celebration",
-                "date": "Dec 31, 8:00 PM",
-                "location": "Floor 5, Rooftop",
-                "description": "Countdown party with fireworks"
-            }
-        ]
-    }
-
-    logger.info(f"[green]Retrieved {len(events['ongoing_events'])} ongoing events[/green]")
-    return TextContent(
-        type="text",
-        text=json.dumps(events, indent=2)
-    )
+    logger.info("FUNCTION CALL: get_current_events()")
+    logger.info("Retrieved %s ongoing events", len(EVENTS["ongoing_events"]))
+    return EVENTS_PAYLOAD
 
 @mcp.tool()
 def get_accessibility_info(shop_name: str) -> TextContent:
@@ -455,27 +548,24 @@ def get_accessibility_info(shop_name: str) -> TextContent:
     Args:
         shop_name: Name of the shop
     """
-    logger.info(f"[blue]FUNCTION CALL:[/blue] get_accessibility_info(shop_name={shop_name})")
-
-    for shop in MALL_DATA["shops"]:
-        if shop["name"].lower() == shop_name.lower():
-            # Generate accessibility info based on floor
-            accessibility = {
-                "shop_name": shop["name"],
-                "floor": shop["floor"],
-                "wheelchair_accessible": True,  # All shops are accessible
-                "elevator_access": f"Elevators 1, 2, 3 serve Floor {shop['floor']}",
-                "wide_aisles": shop["floor"] <= 3,  # Lower floors have wider aisles
-                "accessible_entrance": True,
-                "accessible_restroom_nearby": True,
-                "distance_from_elevator": f"{(shop['id'] % 5 + 1) * 10} meters"
-            }
-
-            logger.info(f"[green]Accessibility info retrieved for {shop['name']}[/green]")
-            return TextContent(
-                type="text",
-                text=json.dumps(accessibility, indent=2)
-            )
+    logger.info("FUNCTION CALL: get_accessibility_info(shop_name=%s)", shop_name)
+
+    shop = SHOPS_BY_NAME_LOWER.get(shop_name.lower())
+    if shop:
+        # Generate accessibility info based on floor
+        accessibility = {
+            "shop_name": shop["name"],
+            "floor": shop["floor"],
+            "wheelchair_accessible": True,  # All shops are accessible
+            "elevator_access": f"Elevators 1, 2, 3 serve Floor {shop['floor']}",
+            "wide_aisles": shop["floor"] <= 3,  # Lower floors have wider aisles
+            "accessible_entrance": True,
+            "accessible_restroom_nearby": True,
+            "distance_from_elevator": f"{(shop['id'] % 5 + 1) * 10} meters"
+        }
+
+        logger.info("Accessibility info retrieved for %s", shop['name'])
+        return _resp(accessibility)
 
     return TextContent(
         type="text",
@@ -490,10 +580,10 @@ def calculate_accessible_route(shop_ids: list) -> TextContent:
     Args:
         shop_ids: List of shop IDs to visit
     """
-    logger.info(f"[blue]FUNCTION CALL:[/blue] calculate_accessible_route(shop_ids={shop_ids})")
+    logger.info("FUNCTION CALL: calculate_accessible_route(shop_ids=%s)", shop_ids)
 
-    # Get shop details
-    shops = [s for s in MALL_DATA["shops"] if s["id"] in shop_ids]
+    # Get shop details (each id counted once)
+    shops = [SHOPS_BY_ID[shop_id] for shop_id in dict.fromkeys(filter(_is_known_shop_id, shop_ids))]
 
     if not shops:
         return TextContent(
@@ -501,17 +591,21 @@ def calculate_accessible_route(shop_ids: list) -> TextContent:
             text=json.dumps({"error": "No valid shops found"})
         )
 
-    # Sort by floor to minimize elevator use
-    sorted_shops = sorted(shops, key=lambda x: x["floor"])
+    # Sort by floor to minimize elevator use, keeping data order within a floor
+    sorted_shops = sorted(shops, key=lambda x: (x["floor"], SHOP_POSITIONS[x["id"]]))
+    # sorted_shops is floor-ordered, so this dedupe is already in ascending order
+    floors_visited = list(dict.fromkeys(s["floor"] for s in sorted_shops))
+    n_floors = len(floors_visited)
+    n_shops = len(sorted_shops)
 
     accessible_route = {
-        "total_shops": len(sorted_shops),
-        "floors_visited": sorted(list(set(s["floor"] for s in sorted_shops))),
+        "total_shops": n_shops,
+        "floors_visited": floors_visited,
         "accessibility_features": {
             "elevator_only": True,
             "no_escalators": True,
             "wide_pathways": True,
-            "rest_points": len(set(s["floor"] for s in sorted_shops))  # One per floor
+            "rest_points": n_floors  # One per floor
         },
         "optimized_order": [
             {
@@ -524,7 +618,7 @@ def calculate_accessible_route(shop_ids: list) -> TextContent:
             }
             for i, shop in enumerate(sorted_shops)
         ],
-        "estimated_time_minutes": len(sorted_shops) * 20 + len(set(s["floor"] for s in sorted_shops)) * 5,  # Extra time for accessibility
+        "estimated_time_minutes": n_shops * 20 + n_floors * 5,  # Extra time for accessibility
         "accessibility_notes": [
             "All routes use elevators only",
             "Wide aisles throughout the path",
@@ -533,11 +627,33 @@ def calculate_accessible_route(shop_ids: list) -> TextContent:
         ]
     }
 
-    logger.info(f"[green]Accessible route calculated: {len(sorted_shops)} shops[/green]")
-    return TextContent(
-        type="text",
-        text=json.dumps(accessible_route, indent=2)
-    )
+    logger.info("Accessible route calculated: %s shops", n_shops)
+    return _resp(accessible_route)
+
+# Mock wait time data (in production, this would be real-time), generated once
+# per shop with its own seeded RNG so results are consistent per location
+def _mock_wait_time(shop: dict) -> dict:
+    """Generate a realistic wait time for a shop based on its category"""
+    rng = random.Random(hash(shop["name"]))
+    if shop["category"] == "Food":
+        wait_minutes = rng.randint(5, 30)
+        crowd_level = "moderate" if wait_minutes < 15 else "busy"
+    elif shop["category"] == "Entertainment":
+        wait_minutes = rng.randint(10, 45)
+        crowd_level = "busy" if wait_minutes > 25 else "moderate"
+    else:
+        wait_minutes = rng.randint(0, 10)
+        crowd_level = "low"
+
+    return {
+        "location": shop["name"],
+        "current_wait_time_minutes": wait_minutes,
+        "crowd_level": crowd_level,
+        "last_updated": "2 minutes ago",
+        "recommendation": "Good time to visit" if wait_minutes < 15 else "Consider visiting later" if wait_minutes > 30 else "Moderate wait expected"
+    }
+
+WAIT_TIME_TABLE = {shop["name"].lower(): _mock_wait_time(shop) for shop in MALL_DATA["shops"]}
 
 @mcp.tool()
 def check_wait_time(location_name: str) -> TextContent:
@@ -547,46 +663,49 @@ def check_wait_time(location_name: str) -> TextContent:
     Args:
         location_name: Name of the location/shop
     """
-    logger.info(f"[blue]FUNCTION CALL:[/blue] check_wait_time(location_name={location_name})")
-
-    # Mock wait time data (in production, this would be real-time)
-    import random
-    random.seed(hash(location_name))  # Consistent results per location
+    logger.info("FUNCTION CALL: check_wait_time(location_name=%s)", location_name)
 
-    for shop in MALL_DATA["shops"]:
-        if shop["name"].lower() == location_name.lower():
-            # Generate realistic wait times based on category
-            if shop["category"] == "Food":
-                wait_minutes = random.randint(5, 30)
-                crowd_level = "moderate" if wait_minutes < 15 else "busy"
-            elif shop["category"] == "Entertainment":
-                wait_minutes = random.randint(10, 45)
-                crowd_level = "busy" if wait_minutes > 25 else "moderate"
-            else:
-                wait_minutes = random.randint(0, 10)
-                crowd_level = "low"
-
-            result = {
-                "location": shop["name"],
-                "current_wait_time_minutes": wait_minutes,
-                "crowd_level": crowd_level,
-                "last_updated": "2 minutes ago",
-                "recommendation": "Good time to visit" if wait_minutes < 15 else "Consider visiting later" if wait_minutes > 30 else "Moderate wait expected"
-            }
-
-            logger.info(f"[green]Wait time: {wait_minutes} min for {shop['name']}[/green]")
-            return TextContent(
-                type="text",
-                text=json.dumps(result, indent=2)
-            )
+    result = WAIT_TIME_TABLE.get(location_name.lower())
+    if result:
+        logger.info("Wait time: %s min for %s", result["current_wait_time_minutes"], result["location"])
+        return _resp(result)
 
     return TextContent(
         type="text",
         text=json.dumps({"error": f"Location '{location_name}' not found"})
     )
 
-# In-memory lost & found storage (in production, use a database)
-LOST_AND_FOUND = []
+# In-memory lost & found storage (in production, use a database), seeded with
+# some mock found items
+LOST_AND_FOUND = [
+    {
+        "item_id": 101,
+        "description": "Black iPhone 15 Pro",
+        "location_found": "Floor 3, Food Court",
+        "date_found": "2025-12-13",
+        "status": "Available at Customer Service"
+    },
+    {
+        "item_id": 102,
+        "description": "Brown leather wallet",
+        "location_found": "Floor 1, Near Fashion Forward",
+        "date_found": "2025-12-12",
+        "status": "Available at Customer Service"
+    },
+    {
+        "item_id": 103,
+        "description": "Car keys with BMW keychain",
+        "location_found": "Parking B2",
+        "date_found": "2025-12-14",
+        "status": "Available at Customer Service"
+    }
+]
+
+# New items get ids above the mock range so they never collide
+_LOST_ITEM_IDS = count(max(item["item_id"] for item in LOST_AND_FOUND) + 1)
+
+# Lowercased descriptions by item id, kept in step with LOST_AND_FOUND for searching
+_LOST_ITEM_SEARCH_TEXT = {item["item_id"]: item["description"].lower() for item in LOST_AND_FOUND}
 
 @mcp.tool()
 def log_lost_item(description: str, location: str, contact_info: Optional[str] = None) -> TextContent:
@@ -598,11 +717,9 @@ def log_lost_item(description: str, location: str, contact_info: Optional[str] =
         location: Where the item was lost
         contact_info: Optional contact information for the person who lost the item
     """
-    logger.info(f"[blue]FUNCTION CALL:[/blue] log_lost_item(description={description}, location={location})")
-
-    from datetime import datetime
+    logger.info("FUNCTION CALL: log_lost_item(description=%s, location=%s)", description, location)
 
-    item_id = len(LOST_AND_FOUND) + 1
+    item_id = next(_LOST_ITEM_IDS)
     lost_item = {
         "item_id": item_id,
         "description": description,
@@ -613,17 +730,15 @@ def log_lost_item(description: str, location: str, contact_info: Optional[str] =
     }
 
     LOST_AND_FOUND.append(lost_item)
+    _LOST_ITEM_SEARCH_TEXT[item_id] = description.lower()
 
-    logger.info(f"[green]Lost item logged with ID: {item_id}[/green]")
-    return TextContent(
-        type="text",
-        text=json.dumps({
-            "success": True,
-            "item_id": item_id,
-            "message": f"Item logged successfully. Please check at Customer Service (Floor 1) or call with reference ID: {item_id}",
-            "item_details": lost_item
-        }, indent=2)
-    )
+    logger.info("Lost item logged with ID: %s", item_id)
+    return _resp({
+        "success": True,
+        "item_id": item_id,
+        "message": f"Item logged successfully. Please check at Customer Service (Floor 1) or call with reference ID: {item_id}",
+        "item_details": lost_item
+    })
 
 @mcp.tool()
 def search_lost_and_found(item_type: str) -> TextContent:
@@ -633,40 +748,13 @@ def search_lost_and_found(item_type: str) -> TextContent:
     Args:
         item_type: Type of item (e.g., "phone", "wallet", "keys", "bag")
     """
-    logger.info(f"[blue]FUNCTION CALL:[/blue] search_lost_and_found(item_type={item_type})")
-
-    # Mock some found items
-    if not LOST_AND_FOUND:
-        # Add some sample data
-        LOST_AND_FOUND.extend([
-            {
-                "item_id": 101,
-                "description": "Black iPhone 15 Pro",
-                "location_found": "Floor 3, Food Court",
-                "date_found": "2025-12-13",
-                "status": "Available at Customer Service"
-            },
-            {
-                "item_id": 102,
-                "description": "Brown leather wallet",
-                "location_found": "Floor 1, Near Fashion Forward",
-                "date_found": "2025-12-12",
-                "status": "Available at Customer Service"
-            },
-            {
-                "item_id": 103,
-                "description": "Car keys with BMW keychain",
-                "location_found": "Parking B2",
-                "date_found": "2025-12-14",
-                "status": "Available at Customer Service"
-            }
-        ])
+    logger.info("FUNCTION CALL: search_lost_and_found(item_type=%s)", item_type)
 
     # Search for matching items
     item_type_lower = item_type.lower()
     matching_items = [
         item for item in LOST_AND_FOUND
-        if item_type_lower in item["description"].lower()
+        if item_type_lower in _LOST_ITEM_SEARCH_TEXT[item["item_id"]]
     ]
 
     result = {
@@ -676,11 +764,8 @@ def search_lost_and_found(item_type: str) -> TextContent:
         "instructions": "If you found your item, please visit Customer Service (Floor 1, Main Entrance) with a valid ID to claim it."
     }
 
-    logger.info(f"[green]Found {len(matching_items)} matching items[/green]")
-    return TextContent(
-        type="text",
-        text=json.dumps(result, indent=2)
-    )
+    logger.info("Found %s matching items", len(matching_items))
+    return _resp(result)
 
 if __name__ == "__main__":
     import sys